@@ -0,0 +1,131 @@
+import asyncio
+import os
+import re
+import threading
+import time
+from collections import OrderedDict
+from fastapi import Request
+from fastapi.responses import JSONResponse, Response
+from sqlalchemy import text
+from starlette.concurrency import run_in_threadpool
+
+FAILURE_THRESHOLD = int(os.getenv("DB_FAILURE_THRESHOLD", "3"))
+PROBE_INTERVAL = float(os.getenv("DB_PROBE_INTERVAL", "2"))
+STALE_CACHE_MAX_ENTRIES = int(os.getenv("STALE_CACHE_MAX_ENTRIES", "1000"))
+
+# public reads that may be answered from the stale cache while the database is down
+STALE_PATHS = [
+    re.compile(r"^/api/tenders$"),
+    re.compile(r"^/api/tenders/[^/]+/status$"),
+    re.compile(r"^/api/bids/[^/]+/status$"),
+]
+
+
+class DatabaseUnavailable(Exception):
+    pass
+
+
+class CircuitBreaker:
+    # opens after FAILURE_THRESHOLD consecutive connection failures, closed again only by the prober
+    def __init__(self, failure_threshold: int):
+        self.failure_threshold = failure_threshold
+        self.failures = 0
+        self.is_open = False
+        self._lock = threading.Lock()
+
+    def check(self):
+        if self.is_open:
+            raise DatabaseUnavailable()
+
+    # once per failed database call: requests coalesced by single-flight re-raise the same exception
+    def record_failure(self, exc: Exception):
+        with self._lock:
+            if getattr(exc, "circuit_recorded", False):
+                return
+            exc.circuit_recorded = True
+            self.failures += 1
+            if self.failures >= self.failure_threshold:
+                self.is_open = True
+
+    def record_success(self):
+        self.failures = 0
+
+    def close(self):
+        with self._lock:
+            self.failures = 0
+            self.is_open = False
+
+
+class StaleCache:
+    def __init__(self, max_entries: int):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def put(self, key: tuple, body: bytes, content_type: str):
+        with self._lock:
+            self._entries[key] = (body, content_type, time.monotonic())
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def get(self, key: tuple):
+        with self._lock:
+            return self._entries.get(key)
+
+
+circuit_breaker = CircuitBreaker(FAILURE_THRESHOLD)
+stale_cache = StaleCache(STALE_CACHE_MAX_ENTRIES)
+
+
+def stale_key(request: Request):
+    if request.method != "GET" or not any(path.match(request.url.path) for path in STALE_PATHS):
+        return None
+    # username is in the query, so per-user status responses are cached per user
+    return request.url.path, tuple(sorted(request.query_params.multi_items()))
+
+
+async def remember_public_reads(request: Request, call_next):
+    response = await call_next(request)
+    key = stale_key(request)
+    if key is None or response.status_code != 200 or "warning" in response.headers:  # skip stale answers
+        return response
+
+    body = b"".join([chunk async for chunk in response.body_iterator])
+    stale_cache.put(key, body, response.headers.get("content-type"))
+    return Response(body, status_code=response.status_code, headers=dict(response.headers))
+
+
+async def database_unavailable_handler(request: Request, exc: DatabaseUnavailable):
+    key = stale_key(request)
+    cached = stale_cache.get(key) if key else None
+    if cached:
+        body, content_type, stored_at = cached
+        return Response(body, media_type=content_type, headers={
+            "Age": str(int(time.monotonic() - stored_at)),
+            "Warning": '110 - "Response is Stale"',
+        })
+
+    return JSONResponse(
+        status_code=503,
+        content={"reason": "Database is unavailable"},
+        headers={"Retry-After": str(int(PROBE_INTERVAL) or 1)},
+    )
+
+
+async def probe_database(engine):
+    while True:
+        await asyncio.sleep(PROBE_INTERVAL)
+        if not circuit_breaker.is_open:
+            continue
+        try:
+            await run_in_threadpool(_ping, engine)
+        except Exception:
+            continue
+        engine.dispose()  # pooled connections may point to the old primary
+        circuit_breaker.close()
+
+
+def _ping(engine):
+    with engine.connect() as connection:
+        connection.execute(text("SELECT 1"))
@@ -0,0 +1,68 @@
+import os
+import threading
+import time
+from enum import Enum as PyEnum
+from fastapi import Response
+from sqlalchemy import text
+from sqlmodel import Session, select, func
+
+EXACT_COUNT_LIMIT = int(os.getenv("EXACT_COUNT_LIMIT", "10000"))
+CACHED_COUNT_TTL = float(os.getenv("CACHED_COUNT_TTL", "60"))
+CACHED_COUNT_MAX_ENTRIES = 1000
+
+_cached_counts = {}
+_cached_counts_lock = threading.Lock()  # filled from single-flight worker threads, invalidated on the event loop
+
+
+class CountMode(PyEnum):
+    EXACT = "exact"
+    ESTIMATED = "estimated"
+    CACHED = "cached"
+
+
+# counts at most EXACT_COUNT_LIMIT + 1 rows, so the count never costs more than scanning that many ids
+def exact_count(session: Session, query):
+    capped = query.limit(EXACT_COUNT_LIMIT + 1).subquery()
+    return session.exec(select(func.count()).select_from(capped)).one()
+
+
+# row estimate of the planner, no rows are read
+def estimated_count(session: Session, query):
+    compiled = query.compile(dialect=session.bind.dialect, compile_kwargs={"literal_binds": True})
+    plan = session.exec(text(f"EXPLAIN (FORMAT JSON) {compiled}")).scalar()
+    return int(plan[0]["Plan"]["Plan Rows"])
+
+
+# query selects only the id column with the list's predicate, without ordering and paging
+def total_count(session: Session, mode: CountMode, query, cache_key: tuple):
+    if mode == CountMode.ESTIMATED:
+        return estimated_count(session, query), mode
+
+    if mode == CountMode.CACHED:
+        with _cached_counts_lock:
+            cached = _cached_counts.get(cache_key)
+        if cached and cached[1] > time.monotonic():
+            return cached[0], mode
+
+    count = exact_count(session, query)
+    if count > EXACT_COUNT_LIMIT:
+        return estimated_count(session, query), CountMode.ESTIMATED
+
+    if mode == CountMode.CACHED:
+        with _cached_counts_lock:
+            if cache_key not in _cached_counts and len(_cached_counts) >= CACHED_COUNT_MAX_ENTRIES:
+                _cached_counts.pop(next(iter(_cached_counts)))
+            _cached_counts[cache_key] = (count, time.monotonic() + CACHED_COUNT_TTL)
+    return count, mode
+
+
+# called after commit by handlers that change what the counted lists contain
+def invalidate_counts(*prefix):
+    with _cached_counts_lock:
+        for key in [key for key in _cached_counts if key[:len(prefix)] == prefix]:
+            del _cached_counts[key]
+
+
+def set_total_count(response: Response, count: int, mode: CountMode):
+    response.headers["X-Total-Count"] = str(count)
+    response.headers["X-Total-Count-Mode"] = mode.value
@@ -1,5 +1,10 @@
+import os
+from contextlib import contextmanager
+from sqlalchemy import event
+from sqlalchemy.exc import TimeoutError
 from sqlmodel import SQLModel, Session
 from app.models import Tender, Bid, BidReview, TenderHistory, BidHistory, BidDecisionRecord
+from app.circuit import circuit_breaker, DatabaseUnavailable
 from sqlmodel import create_engine
 
 DB_HOST = "rc1b-5xmqy6bq501kls4m.mdb.yandexcloud.net"
@@ -12,13 +17,52 @@ DATABASE_URL = f"postgresql://{DB_USER}:{DB_PASSWORD}@{DB_HOST}:{DB_PORT}/{DB_NA
 
 DATABASE_URL += "?target_session_attrs=read-write"
 
-engine = create_engine(DATABASE_URL)
+DB_CONNECT_TIMEOUT = int(os.getenv("DB_CONNECT_TIMEOUT", "3"))
+
+engine = create_engine(DATABASE_URL, connect_args={"connect_timeout": DB_CONNECT_TIMEOUT})
 
 JDBC_URL = f"jdbc:postgresql://{DB_HOST}:{DB_PORT}/{DB_NAME}?targetServerType=primary"
 
 
+@event.listens_for(engine, "handle_error")
+def mark_database_unavailable(context):
+    # failures to connect and dropped connections mean an outage; statement timeouts, deadlocks etc. don't
+    if context.sqlalchemy_exception is not None and (context.connection is None or context.is_disconnect):
+        context.sqlalchemy_exception.database_unavailable = True
+
+
+@event.listens_for(Session, "after_begin")
+def mark_connected(session, transaction, connection):
+    session.info["connected"] = True
+
+
+def is_database_unavailable(exc: Exception):
+    return isinstance(exc, TimeoutError) or getattr(exc, "database_unavailable", False)  # pool timeout or marked above
+
+
+@contextmanager
+def session_scope():
+    circuit_breaker.check()  # fail fast while the database is down
+    # write handlers return rows from UPDATE ... RETURNING, don't reload them after commit
+    with Session(engine, expire_on_commit=False) as session:
+        try:
+            yield session
+        except DatabaseUnavailable:
+            raise
+        except Exception as e:
+            if is_database_unavailable(e):
+                circuit_breaker.record_failure(e)
+                raise DatabaseUnavailable() from e
+            # e.g. HTTPException after queries that went fine; validation errors etc. never reach the database
+            if session.info.get("connected"):
+                circuit_breaker.record_success()
+            raise
+        if session.info.get("connected"):
+            circuit_breaker.record_success()
+
+
 def get_session():
-    with Session(engine) as session:
+    with session_scope() as session:
         yield session
 
 
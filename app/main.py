@@ -1,6 +1,9 @@
+import asyncio
 import os
-from app.routes import ping, tenders, bids
-from app.database import create_db_and_tables
+from app.routes import ping, tenders, bids, batch, metrics, profiles
+from app import profiling
+from app.database import create_db_and_tables, engine
+from app.circuit import DatabaseUnavailable, database_unavailable_handler, probe_database, remember_public_reads
 import uvicorn
 from fastapi.exceptions import RequestValidationError
 from fastapi import FastAPI, Request
@@ -30,13 +33,23 @@ async def validation_exception_handler(request: Request, exc: RequestValidationE
         },
     )
 
+app.add_exception_handler(DatabaseUnavailable, database_unavailable_handler)
+app.middleware("http")(remember_public_reads)
+
 @app.on_event("startup")
 async def startup_event():
     create_db_and_tables()
+    app.state.db_prober = asyncio.create_task(probe_database(engine))
 
 app.include_router(ping.router, prefix="/api")
 app.include_router(tenders.router, prefix="/api")
 app.include_router(bids.router, prefix="/api")
+app.include_router(batch.router, prefix="/api")
+app.include_router(metrics.router, prefix="/api")
+app.include_router(profiles.router, prefix="/api")
+
+if profiling.enabled():
+    profiling.install(app)
 
 if __name__ == "__main__":
     uvicorn.run(app, host="0.0.0.0", port=int(os.getenv("SERVER_PORT", "8080")))
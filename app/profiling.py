@@ -0,0 +1,227 @@
+import asyncio
+import itertools
+import json
+import os
+import sys
+import threading
+import time
+from collections import Counter
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Optional
+from fastapi import Request
+from sqlalchemy import event
+from app.database import engine
+
+PROFILE_ADMIN_TOKEN = os.getenv("PROFILE_ADMIN_TOKEN")
+PROFILE_SAMPLE_RATE = int(os.getenv("PROFILE_SAMPLE_RATE", "0"))  # profile 1 in N requests, 0 - never
+PROFILE_INTERVAL = float(os.getenv("PROFILE_INTERVAL_MS", "1")) / 1000
+PROFILE_DIR = os.getenv("PROFILE_DIR", "/tmp/tender-profiles")
+PROFILE_MAX_FILES = int(os.getenv("PROFILE_MAX_FILES", "50"))
+
+PROFILE_HEADER = "x-profile-token"
+PROFILES_PATH = "/api/profiles"  # viewing profiles is never profiled itself
+
+_current_profile: ContextVar[Optional["Profile"]] = ContextVar("current_profile", default=None)
+_request_counter = itertools.count(1)
+_profile_counter = itertools.count()
+
+
+def enabled():
+    return bool(PROFILE_ADMIN_TOKEN) or PROFILE_SAMPLE_RATE > 0
+
+
+class Sampler(threading.Thread):
+    # statistical profiler: periodically records the stacks of the threads working on one request
+    def __init__(self, profile: "Profile", interval: float):
+        super().__init__(daemon=True)
+        self.profile = profile
+        self.interval = interval
+        self.stacks = Counter()
+        self._stopped = threading.Event()
+
+    def run(self):
+        while not self._stopped.wait(self.interval):
+            frames = sys._current_frames()
+            for thread_id in self.profile.thread_ids():
+                self.sample(thread_id, frames.get(thread_id))
+
+    def sample(self, thread_id: int, frame):
+        # the event loop also runs other requests, there only stacks going through this request's frames count
+        owned = thread_id != self.profile.loop_thread_id
+        stack = []
+        while frame is not None:
+            owned = owned or frame in self.profile.frames
+            code = frame.f_code
+            stack.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})")
+            frame = frame.f_back
+        if stack and owned:
+            self.stacks[";".join(reversed(stack))] += 1
+
+    def stop(self):
+        self._stopped.set()
+        self.join()
+
+
+class Profile:
+    def __init__(self, method: str, path: str):
+        # counter suffix keeps ids of requests started in the same nanosecond apart
+        self.id = f"{time.time_ns()}{next(_profile_counter) % 1000:03d}"
+        self.method = method
+        self.path = path
+        self.queries = []
+        self.loop_thread_id = threading.get_ident()
+        self.frames = set()  # root frames of the request's coroutines on the event loop
+        self._worker_thread_ids = set()
+        self._lock = threading.Lock()
+        self.sampler = Sampler(self, PROFILE_INTERVAL)
+
+    def thread_ids(self):
+        with self._lock:
+            return [self.loop_thread_id, *self._worker_thread_ids]
+
+    def add_worker(self, thread_id: int):
+        with self._lock:
+            self._worker_thread_ids.add(thread_id)
+
+    def remove_worker(self, thread_id: int):
+        with self._lock:
+            self._worker_thread_ids.discard(thread_id)
+
+
+# wraps work the request hands to the threadpool, so the sampler follows it there
+@contextmanager
+def profiled_thread():
+    profile = _current_profile.get()
+    if profile is None:
+        yield
+        return
+    thread_id = threading.get_ident()
+    profile.add_worker(thread_id)
+    try:
+        yield
+    finally:
+        profile.remove_worker(thread_id)
+
+
+def _track_task(profile: Optional[Profile], coro):
+    frame = getattr(coro, "cr_frame", None)
+    if profile is not None and frame is not None:
+        profile.frames.add(frame)
+
+
+async def _install_task_factory():
+    # tasks created while a profiled request runs (e.g. by call_next) belong to that request
+    loop = asyncio.get_running_loop()
+    previous = loop.get_task_factory()
+
+    def task_factory(loop, coro, **kwargs):
+        if previous is not None:
+            task = previous(loop, coro, **kwargs)
+        else:
+            task = asyncio.Task(coro, loop=loop, **kwargs)
+        context = kwargs.get("context")
+        _track_task(context.get(_current_profile) if context is not None else _current_profile.get(), coro)
+        return task
+
+    loop.set_task_factory(task_factory)
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    if _current_profile.get() is not None:
+        conn.info.setdefault("profile_query_start", []).append(time.perf_counter())
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    profile = _current_profile.get()
+    if profile is not None and conn.info.get("profile_query_start"):
+        started = conn.info["profile_query_start"].pop()
+        profile.queries.append({
+            "statement": statement,
+            "duration_ms": round((time.perf_counter() - started) * 1000, 3),
+        })
+
+
+def should_profile(request: Request):
+    if PROFILE_ADMIN_TOKEN and request.headers.get(PROFILE_HEADER) == PROFILE_ADMIN_TOKEN:
+        return True
+    return PROFILE_SAMPLE_RATE > 0 and next(_request_counter) % PROFILE_SAMPLE_RATE == 0
+
+
+async def profile_request(request: Request, call_next):
+    if request.url.path.startswith(PROFILES_PATH) or not should_profile(request):
+        return await call_next(request)
+
+    profile = Profile(request.method, request.url.path)
+    profile.frames.add(sys._getframe())
+    token = _current_profile.set(profile)
+    profile.sampler.start()
+    started = time.perf_counter()
+    status_code = 500
+    try:
+        response = await call_next(request)
+        status_code = response.status_code
+    finally:
+        duration = time.perf_counter() - started
+        profile.sampler.stop()
+        profile.frames.clear()
+        _current_profile.reset(token)
+        save_profile(profile, status_code, duration)
+    response.headers["X-Profile-Id"] = profile.id
+    return response
+
+
+def save_profile(profile: Profile, status_code: int, duration: float):
+    os.makedirs(PROFILE_DIR, exist_ok=True)
+    # collapsed stacks, loadable by speedscope and flamegraph.pl
+    with open(os.path.join(PROFILE_DIR, f"{profile.id}.collapsed"), "w") as f:
+        for stack, count in profile.sampler.stacks.items():
+            f.write(f"{stack} {count}\n")
+    with open(os.path.join(PROFILE_DIR, f"{profile.id}.json"), "w") as f:
+        json.dump({
+            "id": profile.id,
+            "method": profile.method,
+            "path": profile.path,
+            "status_code": status_code,
+            "duration_ms": round(duration * 1000, 3),
+            "samples": sum(profile.sampler.stacks.values()),
+            "queries": profile.queries,
+        }, f)
+
+    for old_id in list_profile_ids()[PROFILE_MAX_FILES:]:
+        for ext in ("json", "collapsed"):
+            try:
+                os.remove(os.path.join(PROFILE_DIR, f"{old_id}.{ext}"))
+            except FileNotFoundError:
+                pass
+
+
+def list_profile_ids():
+    if not os.path.isdir(PROFILE_DIR):
+        return []
+    ids = [name[:-len(".json")] for name in os.listdir(PROFILE_DIR) if name.endswith(".json")]
+    return sorted(ids, key=int, reverse=True)
+
+
+def load_profile(profile_id: str):
+    if not profile_id.isdigit():
+        return None
+    path = os.path.join(PROFILE_DIR, f"{profile_id}.json")
+    try:  # may be rotated out concurrently
+        with open(path) as f:
+            profile = json.load(f)
+        with open(os.path.join(PROFILE_DIR, f"{profile_id}.collapsed")) as f:
+            profile["collapsed"] = f.read()
+    except FileNotFoundError:
+        return None
+    return profile
+
+
+def install(app):
+    # nothing is hooked in unless profiling is configured, so disabled profiling costs nothing
+    if not PROFILE_ADMIN_TOKEN:  # /api/profiles is guarded by it, sampled profiles couldn't be listed otherwise
+        raise RuntimeError("PROFILE_ADMIN_TOKEN must be set when profiling is enabled")
+    event.listen(engine, "before_cursor_execute", _before_cursor_execute)
+    event.listen(engine, "after_cursor_execute", _after_cursor_execute)
+    app.add_event_handler("startup", _install_task_factory)
+    app.middleware("http")(profile_request)
@@ -0,0 +1,86 @@
+import inspect
+from fastapi import APIRouter, Depends, HTTPException, Response
+from fastapi.routing import APIRoute
+from pydantic import TypeAdapter, ValidationError
+from pydantic.fields import FieldInfo
+from pydantic_core import PydanticUndefined
+from sqlmodel import Session
+from starlette.routing import Match
+from typing import Annotated, List
+from app.database import get_session
+from app.routes import tenders, bids
+from app.schemas import BatchOperation, BatchRequest, BatchResult
+
+router = APIRouter()
+
+# parameters filled with the username of the batch, so identity is given and resolved once
+IDENTITY_PARAMS = {"username", "requester_username"}
+
+BATCH_ROUTES = [
+    route for route in tenders.router.routes + bids.router.routes
+    if isinstance(route, APIRoute) and route.methods == {"GET"}
+]
+
+
+def find_route(path: str):
+    if path.startswith("/api/"):
+        path = path[len("/api"):]
+    scope = {"type": "http", "path": path, "method": "GET"}
+    for route in BATCH_ROUTES:
+        match, child_scope = route.matches(scope)
+        if match == Match.FULL:
+            return route, child_scope["path_params"]
+    raise HTTPException(status_code=404, detail="Operation not found")
+
+
+def build_arguments(route: APIRoute, path_params: dict, operation: BatchOperation, username, session: Session):
+    arguments = {}
+    for name, parameter in inspect.signature(route.endpoint).parameters.items():
+        if name == "session":
+            arguments[name] = session
+            continue
+        if parameter.annotation is Response:  # headers set by the handler are not part of the batch result
+            arguments[name] = Response()
+            continue
+
+        if name in IDENTITY_PARAMS:
+            value = username
+        elif name in path_params:
+            value = path_params[name]
+        else:
+            value = operation.params.get(name)
+
+        field = parameter.default if isinstance(parameter.default, FieldInfo) else None
+        if value is None:
+            if field is not None and field.default is not PydanticUndefined:
+                arguments[name] = field.default
+                continue
+            raise HTTPException(status_code=400, detail=f"Missing parameter: {name}")
+
+        annotation = Annotated[parameter.annotation, field] if field is not None else parameter.annotation
+        arguments[name] = TypeAdapter(annotation).validate_python(value)
+    return arguments
+
+
+async def run_operation(operation: BatchOperation, username, session: Session):
+    try:
+        route, path_params = find_route(operation.path)
+        result = await route.endpoint(**build_arguments(route, path_params, operation, username, session))
+        response_type = TypeAdapter(route.response_model)
+        body = response_type.dump_python(response_type.validate_python(result, from_attributes=True), mode="json")
+        return BatchResult(path=operation.path, status=200, body=body)
+    except HTTPException as e:
+        return BatchResult(path=operation.path, status=e.status_code, body={"detail": e.detail})
+    except ValidationError as e:
+        return BatchResult(path=operation.path, status=400, body={"reason": e.errors()[0].get("msg")})
+
+
+# operations share one session and run one after another: a Session can't be used from several threads
+@router.post("/batch", response_model=List[BatchResult])
+async def batch(
+        batch_request: BatchRequest,
+        session: Session = Depends(get_session)
+):
+    session.info["batch"] = True
+    return [await run_operation(operation, batch_request.username, session)
+            for operation in batch_request.operations]
@@ -1,12 +1,15 @@
-from fastapi import APIRouter, Depends, HTTPException, Query
+from fastapi import APIRouter, Depends, Header, HTTPException, Query, Response
 from sqlmodel import Session, select, func
 from app.database import get_session
 from app.models import Bid, Employee, Tender, BidStatus, BidAuthorType, BidDecision, BidReview, \
     OrganizationResponsible, TenderStatus, BidChangeStatus, BidHistory, BidDecisionRecord
 from app.schemas import BidCreate, BidResponse, BidUpdate, BidReviewCreate, BidReviewResponse
-from typing import List
+from typing import List, Optional
 import uuid
-from app.utils import get_user_or_raise, get_tender_or_raise, check_org_responsible
+from app.utils import get_user_or_raise, get_tender_or_raise, check_org_responsible, check_if_match, \
+    snapshot_history, update_versioned_or_raise, response_columns
+from app.counts import CountMode, total_count, invalidate_counts, set_total_count
+from app.singleflight import single_flight
 
 router = APIRouter()
 
@@ -64,7 +67,7 @@ async def get_user_bids(
 ):
     user = get_user_or_raise(username, session)
 
-    query = select(Bid).where(Bid.author_id == user.id)
+    query = select(*response_columns(Bid, BidResponse)).where(Bid.author_id == user.id)
     query = query.order_by(Bid.name).offset(offset).limit(limit)
     bids = session.exec(query).all()
     return bids
@@ -73,20 +76,24 @@ async def get_user_bids(
 # only responsible for tender's organization can view; sees only published bids for his company's tender
 @router.get("/bids/{tender_id}/list", response_model=List[BidResponse])
 async def get_bids_for_tender(
+        response: Response,
         tender_id: uuid.UUID,
         username: str,
         limit: int = Query(5, le=50),
         offset: int = Query(0, ge=0),
+        count: Optional[CountMode] = Query(None),
         session: Session = Depends(get_session)
 ):
     user = get_user_or_raise(username, session)
     tender = get_tender_or_raise(tender_id, session)
 
     check_org_responsible(user.id, tender.organization_id, session)
-    query = select(Bid).where(Bid.tender_id == tender_id)
+    query = select(*response_columns(Bid, BidResponse)).where(Bid.tender_id == tender_id)
     query = query.where(Bid.status == BidStatus.PUBLISHED)
 
     bids = session.exec(query.order_by(Bid.name).offset(offset).limit(limit)).all()
+    if count:
+        set_total_count(response, *total_count(session, count, query.with_only_columns(Bid.id), ("bids", tender_id)))
     return bids
 
 
@@ -111,6 +118,7 @@ async def update_bid_status(
         bid_id: uuid.UUID,
         status: BidChangeStatus,
         username: str,
+        if_match: Optional[str] = Header(None),
         session: Session = Depends(get_session)
 ):
     user = get_user_or_raise(username, session)
@@ -118,23 +126,25 @@ async def update_bid_status(
 
     if bid.author_id != user.id:
         raise HTTPException(status_code=403, detail="User is not authorized to update the status of this bid")
+    check_if_match(if_match, bid.version)
 
     tender = session.get(Tender, bid.tender_id)
     if bid.status in {BidStatus.APPROVED, BidStatus.REJECTED} or tender.status == TenderStatus.CLOSED:
         raise HTTPException(status_code=400, detail="Cannot change status after a decision has been made")
 
     if status == BidChangeStatus.PUBLISHED:
-        bid.status = BidStatus.PUBLISHED
+        new_status = BidStatus.PUBLISHED
     elif status == BidChangeStatus.CREATED:
-        bid.status = TenderStatus.CREATED
+        new_status = BidStatus.CREATED
     elif status == BidChangeStatus.CANCELED:
-        bid.status = BidStatus.CANCELED
+        new_status = BidStatus.CANCELED
     else:
         raise HTTPException(status_code=400, detail="Invalid status")
 
-    session.commit()
-    session.refresh(bid)
-
+    # status change doesn't bump the version, so also require the status we have checked above
+    bid = update_versioned_or_raise(session, Bid, bid.id, bid.version, {"status": new_status},
+                                    Bid.status == bid.status)
+    invalidate_counts("bids", bid.tender_id)
     return bid
 
 
@@ -144,6 +154,7 @@ async def edit_bid(
         bid_id: uuid.UUID,
         bid_update: BidUpdate,
         username: str,
+        if_match: Optional[str] = Header(None),
         session: Session = Depends(get_session)
 ):
     user = get_user_or_raise(username, session)
@@ -151,27 +162,17 @@ async def edit_bid(
 
     if bid.author_id != user.id:
         raise HTTPException(status_code=403, detail="User is not authorized to edit this bid")
+    check_if_match(if_match, bid.version)
 
     tender = session.get(Tender, bid.tender_id)
     if bid.status in {BidStatus.APPROVED, BidStatus.REJECTED} or tender.status == TenderStatus.CLOSED:
         raise HTTPException(status_code=400, detail="Cannot edit an approved or rejected bid")
 
-    bid_history = BidHistory(
-        bid_id=bid.id,
-        name=bid.name,
-        description=bid.description,
-        version=bid.version,
-    )
-    session.add(bid_history)
+    snapshot_history(session, BidHistory, Bid, "bid_id", bid.id, bid.version, ["name", "description"])
 
     bid_data = bid_update.dict(exclude_unset=True)
-    for key, value in bid_data.items():
-        setattr(bid, key, value)
-
-    bid.version += 1
-    session.commit()
-    session.refresh(bid)
-    return bid
+    bid_data["version"] = Bid.version + 1
+    return update_versioned_or_raise(session, Bid, bid.id, bid.version, bid_data)
 
 
 # only responsible for tender's organization can submit decision
@@ -229,6 +230,11 @@ async def submit_bid_decision(
             bid.status = BidStatus.REJECTED
     '''
     session.commit()
+    invalidate_counts("bids", tender.id)
+    if tender.status == TenderStatus.CLOSED:
+        invalidate_counts("tenders")
+        single_flight.forget("get_tenders")
+        single_flight.forget("get_tender_status", tender.id)
     session.refresh(bid)
     return bid
 
@@ -239,6 +245,7 @@ async def rollback_bid(
         bid_id: uuid.UUID,
         version: int,
         username: str,
+        if_match: Optional[str] = Header(None),
         session: Session = Depends(get_session)
 ):
     user = get_user_or_raise(username, session)
@@ -246,6 +253,7 @@ async def rollback_bid(
 
     if bid.author_id != user.id:
         raise HTTPException(status_code=403, detail="User is not the author of this bid")
+    check_if_match(if_match, bid.version)
 
     tender = session.get(Tender, bid.tender_id)
     if tender.status == TenderStatus.CLOSED:
@@ -262,21 +270,13 @@ async def rollback_bid(
     if not historical_bid:
         raise HTTPException(status_code=404, detail="Historical version not found")
 
-    bid_history = BidHistory(
-        bid_id=bid.id,
-        name=bid.name,
-        description=bid.description,
-        version=bid.version,
-    )
-    session.add(bid_history)
-
-    bid.name = historical_bid.name
-    bid.description = historical_bid.description
-    bid.version += 1
+    snapshot_history(session, BidHistory, Bid, "bid_id", bid.id, bid.version, ["name", "description"])
 
-    session.commit()
-    session.refresh(bid)
-    return bid
+    return update_versioned_or_raise(session, Bid, bid.id, bid.version, {
+        "name": historical_bid.name,
+        "description": historical_bid.description,
+        "version": Bid.version + 1,
+    })
 
 
 @router.put("/bids/{bid_id}/feedback", response_model=BidReviewResponse)
@@ -329,7 +329,7 @@ async def get_bid_reviews(
     if not author_bid:
         raise HTTPException(status_code=404, detail="Author has not created a bid for this tender")
 
-    query = select(BidReview).join(Bid).where(Bid.author_id == author.id)
+    query = select(*response_columns(BidReview, BidReviewResponse)).join(Bid).where(Bid.author_id == author.id)
     query = query.order_by(BidReview.created_at.desc()).offset(offset).limit(limit)
     reviews = session.exec(query).all()
     return reviews
@@ -0,0 +1,9 @@
+from fastapi import APIRouter
+from app.singleflight import single_flight
+
+router = APIRouter()
+
+
+@router.get("/metrics/coalescing")
+async def get_coalescing_metrics():
+    return single_flight.stats()
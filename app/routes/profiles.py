@@ -0,0 +1,30 @@
+from fastapi import APIRouter, Header, HTTPException
+from typing import Optional
+from app import profiling
+
+router = APIRouter()
+
+
+def check_profile_token(token: Optional[str]):
+    if not profiling.PROFILE_ADMIN_TOKEN or token != profiling.PROFILE_ADMIN_TOKEN:
+        raise HTTPException(status_code=403, detail="Invalid profile token")
+
+
+@router.get("/profiles")
+async def list_profiles(x_profile_token: Optional[str] = Header(None)):
+    check_profile_token(x_profile_token)
+    profiles = []
+    for profile_id in profiling.list_profile_ids():
+        profile = profiling.load_profile(profile_id)
+        if profile:
+            profiles.append({key: profile[key] for key in ("id", "method", "path", "status_code", "duration_ms")})
+    return profiles
+
+
+@router.get("/profiles/{profile_id}")
+async def get_profile(profile_id: str, x_profile_token: Optional[str] = Header(None)):
+    check_profile_token(x_profile_token)
+    profile = profiling.load_profile(profile_id)
+    if not profile:
+        raise HTTPException(status_code=404, detail="Profile not found")
+    return profile
@@ -1,12 +1,15 @@
-from fastapi import APIRouter, Depends, HTTPException, Query
+from fastapi import APIRouter, Depends, Header, HTTPException, Query, Response
 from sqlmodel import Session, select
 from app.database import get_session
 from app.models import Tender, Employee, OrganizationResponsible, TenderStatus, Bid, BidStatus, \
     TenderServiceType, TenderHistory
 from app.schemas import TenderCreate, TenderResponse, TenderUpdate
-from typing import List
+from typing import List, Optional
 import uuid
-from app.utils import get_user_or_raise, get_tender_or_raise, check_org_responsible
+from app.utils import get_user_or_raise, get_tender_or_raise, check_org_responsible, check_if_match, \
+    snapshot_history, update_versioned_or_raise, response_columns
+from app.singleflight import single_flight
+from app.counts import CountMode, total_count, invalidate_counts, set_total_count
 
 router = APIRouter()
 
@@ -35,16 +38,28 @@ async def create_tender(
 # all PUBLISHED tenders, visible for all users
 @router.get("/tenders", response_model=List[TenderResponse])
 async def get_tenders(
+        response: Response,
         service_type: List[TenderServiceType] = Query(None),
         limit: int = Query(5, le=50),
         offset: int = Query(0, ge=0),
+        count: Optional[CountMode] = Query(None),
         session: Session = Depends(get_session)
 ):
-    query = select(Tender).where(Tender.status == TenderStatus.PUBLISHED)
-    if service_type:
-        query = query.where(Tender.service_type.in_(service_type))
-    query = query.order_by(Tender.name).offset(offset).limit(limit)
-    tenders = session.exec(query).all()
+    service_types = tuple(sorted({s.value for s in service_type or []}))
+
+    def load(session: Session):
+        query = select(*response_columns(Tender, TenderResponse)).where(Tender.status == TenderStatus.PUBLISHED)
+        if service_type:
+            query = query.where(Tender.service_type.in_(service_type))
+        page = query.order_by(Tender.name).offset(offset).limit(limit)
+        tenders = [TenderResponse.model_validate(row) for row in session.exec(page).all()]
+        if not count:
+            return tenders, None
+        return tenders, total_count(session, count, query.with_only_columns(Tender.id), ("tenders", service_types))
+
+    tenders, total = await single_flight.do("get_tenders", (service_types, limit, offset, count), load, session)
+    if total:
+        set_total_count(response, *total)
     return tenders
 
 
@@ -58,8 +73,8 @@ async def get_user_tenders(
 ):
     user = get_user_or_raise(username, session)
 
-    query = select(Tender).join(OrganizationResponsible,
-                                Tender.organization_id == OrganizationResponsible.organization_id)
+    query = select(*response_columns(Tender, TenderResponse)).join(
+        OrganizationResponsible, Tender.organization_id == OrganizationResponsible.organization_id)
     query = query.where(OrganizationResponsible.user_id == user.id)
     query = query.order_by(Tender.name).offset(offset).limit(limit)
     tenders = session.exec(query).all()
@@ -73,10 +88,14 @@ async def get_tender_status(
         username: str,
         session: Session = Depends(get_session)
 ):
-    user = get_user_or_raise(username, session)
-    tender = get_tender_or_raise(tender_id, session)
-    check_org_responsible(user.id, tender.organization_id, session)
-    return tender.status
+    def load(session: Session):
+        user = get_user_or_raise(username, session)
+        tender = get_tender_or_raise(tender_id, session)
+        check_org_responsible(user.id, tender.organization_id, session)
+        return tender.status
+
+    # username is part of the key: the response depends on who is asking
+    return await single_flight.do("get_tender_status", (tender_id, username), load, session)
 
 
 # only organization responsible can edit
@@ -99,6 +118,10 @@ async def update_tender_status(
             bid.status = BidStatus.CANCELED
 
     session.commit()
+    invalidate_counts("tenders")
+    invalidate_counts("bids", tender_id)
+    single_flight.forget("get_tenders")
+    single_flight.forget("get_tender_status", tender_id)
     session.refresh(tender)
     return tender
 
@@ -109,28 +132,22 @@ async def edit_tender(
         tender_id: uuid.UUID,
         tender_update: TenderUpdate,
         username: str,
+        if_match: Optional[str] = Header(None),
         session: Session = Depends(get_session)
 ):
     user = get_user_or_raise(username, session)
     tender = get_tender_or_raise(tender_id, session)
     check_org_responsible(user.id, tender.organization_id, session)
+    check_if_match(if_match, tender.version)
 
-    tender_history = TenderHistory(  # for rollback
-        tender_id=tender.id,
-        name=tender.name,
-        description=tender.description,
-        service_type=tender.service_type,
-        version=tender.version,
-    )
-    session.add(tender_history)
+    snapshot_history(session, TenderHistory, Tender, "tender_id", tender.id, tender.version,  # for rollback
+                     ["name", "description", "service_type"])
 
     tender_data = tender_update.dict(exclude_unset=True)
-    for key, value in tender_data.items():
-        setattr(tender, key, value)
-
-    tender.version += 1
-    session.commit()
-    session.refresh(tender)
+    tender_data["version"] = Tender.version + 1
+    tender = update_versioned_or_raise(session, Tender, tender.id, tender.version, tender_data)
+    invalidate_counts("tenders")  # service_type may have changed
+    single_flight.forget("get_tenders")
     return tender
 
 
@@ -139,11 +156,13 @@ async def rollback_tender(
         tender_id: uuid.UUID,
         version: int,
         username: str,
+        if_match: Optional[str] = Header(None),
         session: Session = Depends(get_session)
 ):
     user = get_user_or_raise(username, session)
     tender = get_tender_or_raise(tender_id, session)
     check_org_responsible(user.id, tender.organization_id, session)
+    check_if_match(if_match, tender.version)
 
     if version >= tender.version:
         raise HTTPException(status_code=400, detail="Invalid version for rollback")
@@ -156,20 +175,15 @@ async def rollback_tender(
     if not historical_tender:
         raise HTTPException(status_code=404, detail="Historical version not found")
 
-    tender_history = TenderHistory(
-        tender_id=tender.id,
-        name=tender.name,
-        description=tender.description,
-        service_type=tender.service_type,
-        version=tender.version,
-    )
-    session.add(tender_history)
-
-    tender.name = historical_tender.name
-    tender.description = historical_tender.description
-    tender.service_type = historical_tender.service_type
-
-    tender.version += 1
-    session.commit()
-    session.refresh(tender)
+    snapshot_history(session, TenderHistory, Tender, "tender_id", tender.id, tender.version,
+                     ["name", "description", "service_type"])
+
+    tender = update_versioned_or_raise(session, Tender, tender.id, tender.version, {
+        "name": historical_tender.name,
+        "description": historical_tender.description,
+        "service_type": historical_tender.service_type,
+        "version": Tender.version + 1,
+    })
+    invalidate_counts("tenders")
+    single_flight.forget("get_tenders")
     return tender
@@ -1,6 +1,7 @@
 from pydantic import BaseModel, Field, ConfigDict
 from app.models import TenderStatus, TenderServiceType, BidStatus, BidAuthorType
 from datetime import datetime
+from typing import Any, Dict, List, Optional
 import uuid
 
 
@@ -65,3 +66,19 @@ class BidReviewResponse(BaseModel):
     created_at: datetime
 
     model_config = ConfigDict(from_attributes=True)
+
+
+class BatchOperation(BaseModel):
+    path: str  # e.g. /tenders/{tender_id}/status, only GET endpoints
+    params: Dict[str, Any] = {}
+
+
+class BatchRequest(BaseModel):
+    username: Optional[str] = None
+    operations: List[BatchOperation] = Field(..., min_length=1, max_length=20)
+
+
+class BatchResult(BaseModel):
+    path: str
+    status: int
+    body: Any
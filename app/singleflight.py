@@ -0,0 +1,83 @@
+import asyncio
+import os
+from collections import Counter
+from sqlmodel import Session
+from starlette.concurrency import run_in_threadpool
+from app.database import session_scope
+from app.profiling import profiled_thread
+
+DEFAULT_WINDOW_MS = os.getenv("COALESCE_WINDOW_MS", "0")
+
+
+def coalesce_window(name: str):
+    # COALESCE_WINDOW_MS_GET_TENDERS=200 overrides the default window for get_tenders
+    return float(os.getenv(f"COALESCE_WINDOW_MS_{name.upper()}", DEFAULT_WINDOW_MS)) / 1000
+
+
+class SingleFlight:
+    # identical concurrent reads share one in-flight query; within the window after it finishes
+    # its result is still handed out to late arrivals
+    def __init__(self):
+        self._calls = {}
+        self._windows = {}
+        self.executed = Counter()
+        self.saved = Counter()
+
+    def window(self, name: str):
+        if name not in self._windows:
+            self._windows[name] = coalesce_window(name)
+        return self._windows[name]
+
+    async def do(self, name: str, key: tuple, fn, session: Session):
+        # batch operations stay on the batch's session and resolved user; for other requests
+        # the session is left unused (it never connects) and the load runs on its own one
+        if session.info.get("batch"):
+            return fn(session)
+
+        key = (name,) + key
+        task = self._calls.get(key)
+        if task is not None:
+            self.saved[name] += 1
+            return await asyncio.shield(task)
+
+        task = asyncio.ensure_future(run_in_threadpool(self._run, fn))
+        self._calls[key] = task
+        self.executed[name] += 1
+        task.add_done_callback(lambda t: self._finish(name, key, t))
+        return await asyncio.shield(task)
+
+    # the shared load gets its own session: it outlives the leader request if that one is cancelled
+    @staticmethod
+    def _run(fn):
+        with profiled_thread(), session_scope() as session:
+            return fn(session)
+
+    def _finish(self, name: str, key: tuple, task):
+        window = self.window(name)
+        if task.cancelled() or task.exception() is not None or window <= 0:
+            self._forget(key, task)
+        else:
+            asyncio.get_running_loop().call_later(window, self._forget, key, task)
+
+    # called by writes next to invalidate_counts, so reads after a write don't get a result kept for the window
+    def forget(self, name: str, *key_prefix):
+        prefix = (name,) + key_prefix
+        for key in [key for key in self._calls if key[:len(prefix)] == prefix]:
+            del self._calls[key]
+
+    def _forget(self, key: tuple, task):
+        if self._calls.get(key) is task:
+            del self._calls[key]
+
+    def stats(self):
+        return {
+            name: {
+                "executed": self.executed[name],
+                "saved": self.saved[name],
+                "window_ms": self.window(name) * 1000,
+            }
+            for name in sorted(set(self.executed) | set(self.saved))
+        }
+
+
+single_flight = SingleFlight()
@@ -1,13 +1,20 @@
 from fastapi import HTTPException
+from sqlalchemy import DateTime, UUID, insert, literal, update
 from sqlmodel import Session, select
 from app.models import Employee, Tender, OrganizationResponsible
+from datetime import datetime
+from typing import Optional
 import uuid
 
 
 def get_user_or_raise(username: str, session: Session):
-    user = session.exec(select(Employee).where(Employee.username == username)).first()
+    users = session.info.setdefault("users", {})  # resolved once per session, e.g. for all operations of a batch
+    user = users.get(username)
+    if not user:
+        user = session.exec(select(Employee).where(Employee.username == username)).first()
     if not user:
         raise HTTPException(status_code=401, detail="User does not exist")
+    users[username] = user
     return user
 
 
@@ -26,3 +33,63 @@ def check_org_responsible(user_id: uuid.UUID, organization_id: uuid.UUID, sessio
     if not org_resp:
         raise HTTPException(status_code=403, detail="User is not responsible for this organization")
     return org_resp
+
+
+# only the columns returned by the response schema; rows are plain tuples, they skip the session identity map
+def response_columns(model, schema):
+    return [getattr(model, field) for field in schema.model_fields]
+
+
+def check_if_match(if_match: Optional[str], version: int):
+    # If-Match: <version>, quoted or as a comma-separated list; * alone matches any version.
+    # Comparison is strong (RFC 9110), so weak tags W/"<version>" never match
+    if if_match is None:
+        return
+    values = [value.strip() for value in if_match.split(",")]
+    if values == ["*"]:
+        return
+    versions = []
+    for value in values:
+        weak = value.startswith("W/")
+        tag = value[2:] if weak else value
+        if tag.startswith('"') and tag.endswith('"') and len(tag) >= 2:
+            tag = tag[1:-1]
+        elif weak:
+            raise HTTPException(status_code=400, detail="Invalid If-Match header")
+        if not tag.isdigit():
+            raise HTTPException(status_code=400, detail="Invalid If-Match header")
+        if not weak:
+            versions.append(int(tag))
+    if version not in versions:
+        raise HTTPException(status_code=412, detail="Version does not match If-Match header")
+
+
+# INSERT ... SELECT of the row as it is at the expected version; if the following update conflicts,
+# the rollback discards this history row too
+def snapshot_history(session: Session, history_model, model, owner_field: str, obj_id: uuid.UUID, version: int,
+                     fields: list):
+    source = select(
+        literal(uuid.uuid4(), UUID(as_uuid=True)),
+        model.id,
+        *[getattr(model, field) for field in fields],
+        model.version,
+        literal(datetime.utcnow(), DateTime),
+    ).where(model.id == obj_id, model.version == version)
+    session.exec(insert(history_model).from_select(["id", owner_field, *fields, "version", "created_at"], source))
+
+
+# single UPDATE ... WHERE id = ? AND version = ? RETURNING *; 409 if someone changed the row since it was read
+def update_versioned_or_raise(session: Session, model, obj_id: uuid.UUID, version: int, values: dict, *conditions):
+    statement = (
+        update(model)
+        .where(model.id == obj_id, model.version == version, *conditions)
+        .values(**values)
+        .returning(model)
+        .execution_options(populate_existing=True)
+    )
+    obj = session.exec(statement).scalars().first()
+    if not obj:
+        session.rollback()
+        raise HTTPException(status_code=409, detail="Resource was modified concurrently, reload and retry")
+    session.commit()
+    return obj
@@ -0,0 +1,85 @@
+# Time and memory per 50-row page of get_tenders / get_bids_for_tender: ORM entities vs. response column tuples.
+# Run from the repository root: python -m bench.list_projection
+# Uses an in-memory SQLite database by default, BENCH_DATABASE_URL points it at Postgres.
+import os
+import time
+import tracemalloc
+import uuid
+from sqlalchemy import create_engine
+from sqlmodel import Session, select
+from app.models import Base, Bid, BidAuthorType, BidStatus, Tender, TenderServiceType, TenderStatus
+from app.schemas import BidResponse, TenderResponse
+from app.utils import response_columns
+
+DATABASE_URL = os.getenv("BENCH_DATABASE_URL", "sqlite://")
+ROWS = int(os.getenv("BENCH_ROWS", "5000"))
+PAGE_SIZE = 50
+TIMING_RUNS = int(os.getenv("BENCH_TIMING_RUNS", "200"))
+MEMORY_RUNS = int(os.getenv("BENCH_MEMORY_RUNS", "20"))
+
+
+def seed(engine):
+    Base.metadata.drop_all(engine)
+    Base.metadata.create_all(engine)
+    tender_id = uuid.uuid4()
+    with Session(engine) as session:
+        session.add(Tender(id=tender_id, name="Tender", description="d" * 500, organization_id=None,
+                           service_type=TenderServiceType.CONSTRUCTION, status=TenderStatus.PUBLISHED))
+        for i in range(ROWS):
+            session.add(Tender(name=f"Tender {i:05d}", description="d" * 500, organization_id=None,
+                               service_type=TenderServiceType.CONSTRUCTION, status=TenderStatus.PUBLISHED))
+            session.add(Bid(name=f"Bid {i:05d}", description="d" * 500, tender_id=tender_id,
+                            author_type=BidAuthorType.USER, author_id=uuid.uuid4(), status=BidStatus.PUBLISHED))
+        session.commit()
+    return tender_id
+
+
+def tender_page(columns: bool):
+    query = select(*response_columns(Tender, TenderResponse)) if columns else select(Tender)
+    return (query.where(Tender.status == TenderStatus.PUBLISHED)
+            .order_by(Tender.name).offset(PAGE_SIZE).limit(PAGE_SIZE)), TenderResponse
+
+
+def bid_page(columns: bool, tender_id: uuid.UUID):
+    query = select(*response_columns(Bid, BidResponse)) if columns else select(Bid)
+    return (query.where(Bid.tender_id == tender_id, Bid.status == BidStatus.PUBLISHED)
+            .order_by(Bid.name).offset(PAGE_SIZE).limit(PAGE_SIZE)), BidResponse
+
+
+# one request: fresh session, page query, conversion to the response schema
+def load_page(engine, query, schema):
+    with Session(engine) as session:
+        return [schema.model_validate(row) for row in session.exec(query).all()]
+
+
+def measure(engine, query, schema):
+    load_page(engine, query, schema)  # warm up statement cache and connection pool
+
+    started = time.perf_counter()
+    for _ in range(TIMING_RUNS):
+        load_page(engine, query, schema)
+    ms_per_page = (time.perf_counter() - started) * 1000 / TIMING_RUNS
+
+    peaks = []
+    for _ in range(MEMORY_RUNS):
+        tracemalloc.start()
+        load_page(engine, query, schema)
+        peaks.append(tracemalloc.get_traced_memory()[1])
+        tracemalloc.stop()
+    return ms_per_page, sum(peaks) / len(peaks) / 1024
+
+
+def main():
+    engine = create_engine(DATABASE_URL)
+    tender_id = seed(engine)
+
+    print(f"{'endpoint':<22}{'loading':<10}{'ms/page':>10}{'peak KiB/page':>16}")
+    for endpoint, page in (("get_tenders", lambda columns: tender_page(columns)),
+                           ("get_bids_for_tender", lambda columns: bid_page(columns, tender_id))):
+        for columns in (False, True):
+            ms_per_page, peak_kib = measure(engine, *page(columns))
+            print(f"{endpoint:<22}{'columns' if columns else 'entities':<10}{ms_per_page:>10.3f}{peak_kib:>16.1f}")
+
+
+if __name__ == "__main__":
+    main()